@@ -1,5 +1,4 @@
-from __future__ import print_function
-
+import io
 import os
 import re
 import sys
@@ -7,9 +6,19 @@ import time
 import uuid
 import shlex
 import atexit
+import selectors
 import shutil
+import tempfile
+import functools
 import subprocess
-from threading import Thread, Lock
+if os.name == 'posix':
+    import fcntl
+else:
+    import msvcrt
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Timer
 from xml.etree import ElementTree
 
 def pprint(elem, level=0):
@@ -31,7 +40,11 @@ def pprint(elem, level=0):
     return elem
 
 # Monkey-patch the pprint function for the ElementTree.Element object
-ElementTree.Element.pprint = pprint
+try:
+    ElementTree.Element.pprint = pprint
+except TypeError:
+    # The C-accelerated Element type does not accept new attributes
+    pass
 
 
 # Global variable used to restart ADB server upon initialization of module
@@ -62,19 +75,67 @@ __KEY_CODES__ = {
     'APP_SWITCH': 187,
 }
 
+# Patterns applied on every call of the functions below, compiled once at module load
+_FOCUS_RE = re.compile(r'[\w\.]+/[\w\.]+')
+_CURR_FOCUS_RE = re.compile(r'mCurrentFocus')
+_FOCUSED_APP_RE = re.compile(r'mFocusedApp')
+_APP_ERR_RE = re.compile(r'Application (Error|Not Responding)')
+# Apk paths may themselves contain '=' (base64 install-session directories on Android
+# 11+), so anchor the package name capture to the last '=' on each line
+_PKG_RE = re.compile(rb'^package:\S+=([^=\s]+)\r?$', re.MULTILINE)
+_PKG_LINE_RE = re.compile(r'^package:\S+=([^=\s]+)$')
+_PKG_ACT_TMPL = r'\w{8} %s/([\.\w]+) filter \w{8}'
+
+# Cache for dynamic patterns (per-package activities, grep filters) to skip re-compilation
+_cached_compile = functools.lru_cache(maxsize=64)(re.compile)
+
+@functools.lru_cache(maxsize=64)
+def _pkg_activities_re(package_name):
+    return re.compile(_PKG_ACT_TMPL % re.escape(package_name))
+
+# Resolving a binary name scans every directory in PATH, so do it at most once per name
+@functools.lru_cache(maxsize=None)
+def _resolve_bin(binary_name):
+    return shutil.which(binary_name)
+
+def _lock_exclusive(handle):
+    ''' Blocks until an exclusive lock is held on the given file handle '''
+    if os.name == 'posix':
+        fcntl.flock(handle, fcntl.LOCK_EX)
+    else:
+        # LK_LOCK gives up after roughly 10 seconds, keep retrying until it is granted
+        handle.seek(0)
+        while True:
+            try:
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass
+
+def _unlock(handle):
+    ''' Releases a lock previously acquired with _lock_exclusive '''
+    if os.name == 'posix':
+        fcntl.flock(handle, fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 class HostProcess(object):
     ''' Wrapper for executing commands in this process' shell '''
     
     def __init__(self, binary_name=None, singleton=False, debug=False):
         self.bin = self.type_check_cmd(binary_name)
-        if len(self.bin) > 0 and hasattr(shutil, 'which'):
-            self.bin[0] = shutil.which(self.bin[0])
+        if len(self.bin) > 0:
+            self.bin[0] = _resolve_bin(self.bin[0])
             if not self.bin[0]:
                 raise ValueError('Binary not found in path: "%s"' % binary_name)
         self._singleton = singleton
         self._debug = debug
         self.lock = Lock()
         self.proc_pool = []
+        self._print('Subprocess posix_spawn fast path enabled: %r'
+                    % getattr(subprocess, '_USE_POSIX_SPAWN', False))
 
         # Register process-level exit handler in case the process calling this gets killed
         atexit.register(self._exit_handler)
@@ -94,16 +155,31 @@ class HostProcess(object):
 
     @staticmethod
     def type_check_cmd(cmd):
-        str_types = str if sys.version_info >= (3, 0, 0) else (str, unicode)
         if cmd is None:
-            cmd = list()
-        if isinstance(cmd, str_types):
+            return []
+        if isinstance(cmd, str):
             cmd = shlex.split(cmd, posix=(os.name == 'posix'))
-        if not hasattr(cmd, '__iter__') or not all([isinstance(c, str_types) for c in cmd]):
+        elif not isinstance(cmd, (list, tuple)):
             raise ValueError('Parameter "cmd" must be of type str or list of str, instead found: %r' % cmd)
-        return [cmd.strip() for cmd in cmd]
+        if not all(isinstance(c, str) for c in cmd):
+            raise ValueError('Parameter "cmd" must be of type str or list of str, instead found: %r' % cmd)
+        return [c.strip() for c in cmd]
 
-    def exec_cmd(self, args, timeout=None, grep=None, callback=None):
+    @staticmethod
+    def grep_filter(output, grep):
+        ''' Filters output, keeping only lines that match the given pattern '''
+        # Single multiline scan over the whole buffer instead of a Python-level loop over
+        # splitlines(); the trailing lookahead strips whitespace at the end of each line.
+        # Undecoded output is matched as bytes directly, which avoids a full decode pass
+        if isinstance(output, bytes):
+            if not isinstance(grep, bytes):
+                grep = grep.encode('utf-8')
+            rgx = _cached_compile(rb'^.*(?:%s).*?(?=[ \t\r]*$)' % grep, re.MULTILINE)
+            return b'\n'.join([mat.group(0) for mat in rgx.finditer(output)])
+        rgx = _cached_compile(r'^.*(?:%s).*?(?=[ \t\r]*$)' % grep, re.MULTILINE)
+        return '\n'.join([mat.group(0) for mat in rgx.finditer(output)])
+
+    def exec_cmd(self, args, timeout=None, grep=None, callback=None, binary=False):
 
         # If this requires current working dir change, acquire lock
         if self._singleton:
@@ -114,30 +190,71 @@ class HostProcess(object):
         self._print('> ' + ' '.join(cmd))
 
         # Execute and parse output
+        # cmd is already a parsed argument list, and not passing cwd, env or preexec_fn
+        # keeps CPython on its posix_spawn fast path (Python 3.8+), avoiding fork() cost
         proc = subprocess.Popen(
-            cmd, shell=(os.name != 'posix' and sys.version_info < (3, 0, 0)),
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            cmd, shell=False,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=65536)
 
         # Add process to internal pool
         self.proc_pool.append(proc)
 
+        # With stderr merged into stdout a single read loop is enough, skipping the reader
+        # threads that communicate() spawns per call; a watchdog timer enforces timeouts
+        timed_out = []
+        watchdog = None
+        if timeout:
+            def _kill_proc():
+                timed_out.append(True)
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+            watchdog = Timer(timeout, _kill_proc)
+            watchdog.start()
+
         try:
-            if sys.version_info >= (3, 3, 0) and timeout > 0:
-                output, error = proc.communicate(timeout=timeout)
+            # Read fixed-size chunks into a single buffer to avoid the many small reads
+            # and reallocations of communicate() on large payloads
+            output = bytearray()
+            if os.name == 'posix':
+                # Polling via select lets the loop notice a watchdog kill even when an
+                # orphaned child process keeps the other end of the pipe open
+                fd = proc.stdout.fileno()
+                sel = selectors.DefaultSelector()
+                sel.register(fd, selectors.EVENT_READ)
+                while not timed_out:
+                    if not sel.select(timeout=0.1 if timeout else None):
+                        continue
+                    chunk = os.read(fd, 65536)
+                    if not chunk:
+                        break
+                    output.extend(chunk)
+                sel.close()
             else:
-                output, error = proc.communicate()
-            output = str(output.decode('utf-8').rstrip())
-                
+                # Windows pipes cannot be multiplexed with select, use a blocking loop
+                chunk = proc.stdout.read(65536)
+                while chunk:
+                    output.extend(chunk)
+                    chunk = proc.stdout.read(65536)
+            output = bytes(output)
+            proc.wait()
+
+            if timed_out:
+                message = f'Process "{proc.pid}" timed out after {timeout} seconds'
+                print(message, sys.stderr)
+                # Keep the return type consistent with what the caller asked for
+                output = message.encode('utf-8') if binary else message
+            elif not binary:
+                # Decode once at the very end; binary callers get the raw bytes untouched
+                output = output.decode('utf-8').rstrip()
+
         except UnicodeDecodeError:
             pass
-        except (subprocess.TimeoutExpired if sys.version_info >= (3, 3, 0) else UnicodeDecodeError):
-            try:
-                proc.kill()
-                output = 'Process "%s" timed out after %s seconds' % (proc.pid, str(timeout))
-                print(output, sys.stderr)
-            except OSError:
-                pass
         finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
             # Process is done, remove from pool
             self.proc_pool.remove(proc)
 
@@ -147,15 +264,29 @@ class HostProcess(object):
             
             # If grep was given, filter output
             if grep:
-                rgx = re.compile(grep)
-                lines = [line.rstrip() for line in output.splitlines()]
-                output = '\n'.join([line for line in lines if rgx.search(line)])
+                output = HostProcess.grep_filter(output, grep)
 
         if callback:
             callback(proc.returncode, output)
 
         return proc.returncode, output
 
+    def exec_cmd_stream(self, args):
+        ''' Like exec_cmd, but yields output lines as the subprocess produces them '''
+        cmd = self.bin + self.type_check_cmd(args)
+        self._print('> ' + ' '.join(cmd))
+        proc = subprocess.Popen(
+            cmd, shell=False,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=65536)
+        self.proc_pool.append(proc)
+        try:
+            for line in proc.stdout:
+                yield line.decode('utf-8').rstrip()
+        finally:
+            proc.stdout.close()
+            proc.wait()
+            self.proc_pool.remove(proc)
+
 class ADB(HostProcess):
     ''' Wrapper for the ADB command that includes many common operations '''
     
@@ -164,11 +295,28 @@ class ADB(HostProcess):
 
         HostProcess.__init__(self, 'adb', debug=debug)
         self.default_target_device = None
-        
-        # Has the ADB server been restarted at least once?
+
+        # Persistent `adb shell` sessions and their locks, keyed by device id, see shell()
+        self._shell_sessions = {}
+        self._shell_sentinel = f'__END_{uuid.uuid4().hex}__'
+        self.device_locks = defaultdict(Lock)
+
+        # Reuse an already-running ADB server when it looks healthy; restarting costs two
+        # subprocess spawns plus a multi-second handshake. The restart is serialized
+        # across processes with a blocking OS-level lock on a persistent file: the lock
+        # is released even if its holder dies mid-restart, and waiters proceed only once
+        # the restart has completed, re-probing instead of restarting a second time
         if __ADB_RESTART__:
-            self.kill_server()
-            self.start_server()
+            if not self._server_healthy():
+                lock_file = os.path.join(tempfile.gettempdir(), 'adbpy-restart.lock')
+                with open(lock_file, 'a') as lock_handle:
+                    _lock_exclusive(lock_handle)
+                    try:
+                        if not self._server_healthy():
+                            self.kill_server()
+                            self.start_server()
+                    finally:
+                        _unlock(lock_handle)
             __ADB_RESTART__ = False
             
         # If we are given a device, try to connect
@@ -177,23 +325,115 @@ class ADB(HostProcess):
 
         # Internal flags
         self.pending_wakeup = False
+        self._last_screen_on = defaultdict(float)
+
+    def _server_healthy(self):
+        ''' Checks whether a running ADB server responds to a device listing '''
+        retcode, output = HostProcess.exec_cmd(self, ['devices'])
+        return retcode == 0 and 'List of devices attached' in output
 
-    def run(self, cmd, grep=None, target_device=None):
+    def run(self, cmd, grep=None, target_device=None, binary=False, timeout=None):
         if target_device is None and self.default_target_device:
             target_device = self.default_target_device
         opt = [] if target_device is None else ['-s', target_device]
         cmd = opt + HostProcess.type_check_cmd(cmd)
-        retcode, output = HostProcess.exec_cmd(self, cmd, grep=grep)
-        self._print(output)
+        retcode, output = HostProcess.exec_cmd(self, cmd, grep=grep, binary=binary,
+                                               timeout=timeout)
+        if not binary:
+            self._print(output)
         return output
 
+    def run_many(self, cmds, target_devices=None, grep=None):
+        ''' Runs several commands concurrently, each against its corresponding device '''
+        cmds = list(cmds)
+        if target_devices is None or isinstance(target_devices, str):
+            target_devices = [target_devices] * len(cmds)
+        if len(cmds) != len(target_devices):
+            raise ValueError('Parameters "cmds" and "target_devices" must be of equal length')
+        with ThreadPoolExecutor(max_workers=min(32, max(len(cmds), 1))) as executor:
+            futures = [executor.submit(self.run, cmd, grep=grep, target_device=device)
+                       for cmd, device in zip(cmds, target_devices)]
+            return [future.result() for future in futures]
+
+    def _get_shell_session(self, target_device):
+        ''' Returns a persistent `adb shell` process for the device, creating one if needed '''
+        proc = self._shell_sessions.get(target_device)
+        if proc is None or proc.poll() is not None:
+            proc = subprocess.Popen(
+                self.bin + ['-s', target_device, 'shell'], stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+            self.proc_pool.append(proc)
+            self._shell_sessions[target_device] = proc
+        return proc
+
+    def _drop_shell_session(self, target_device):
+        ''' Discards the persistent shell session for the device, if one exists '''
+        proc = self._shell_sessions.pop(target_device, None)
+        if proc is not None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+            if proc in self.proc_pool:
+                self.proc_pool.remove(proc)
+
     def shell(self, cmd, grep=None, target_device=None):
-        cmd = ['shell'] + HostProcess.type_check_cmd(cmd)
-        return self.run(cmd, grep=grep, target_device=target_device)
+        if target_device is None and self.default_target_device:
+            target_device = self.default_target_device
+        cmd_args = HostProcess.type_check_cmd(cmd)
+
+        # Without a fixed target device, fall back to one subprocess per command
+        if target_device is None:
+            return self.run(['shell'] + cmd_args, grep=grep, target_device=target_device)
 
-    def exec_out(self, cmd, grep=None, target_device=None):
+        # Reuse a long-lived `adb shell` process: each command becomes a single write to its
+        # stdin, terminated by a sentinel echo that marks the end of the command's output
+        cmd = ' '.join(cmd_args)
+        self._print('$ ' + cmd)
+        try:
+            with self.device_locks[target_device]:
+                proc = self._get_shell_session(target_device)
+                proc.stdin.write(f'{cmd}; echo {self._shell_sentinel} $?\n'.encode('utf-8'))
+                proc.stdin.flush()
+                lines = []
+                while True:
+                    line = proc.stdout.readline()
+                    if not line:
+                        raise ConnectionError(
+                            'Shell session for device "%s" closed unexpectedly' % target_device)
+                    line = line.decode('utf-8', 'replace').rstrip()
+                    if self._shell_sentinel in line:
+                        # Commands whose output lacks a trailing newline leave the sentinel
+                        # on the same line as the last output chunk, so look for it anywhere
+                        # in the line and keep whatever precedes it
+                        remainder = line.split(self._shell_sentinel)[0]
+                        if remainder:
+                            lines.append(remainder)
+                        break
+                    lines.append(line)
+        except (OSError, ConnectionError):
+            # The session is no longer usable (e.g. device disconnected); drop it and retry
+            # the command as a one-shot subprocess
+            self._drop_shell_session(target_device)
+            return self.run(['shell'] + cmd_args, grep=grep, target_device=target_device)
+
+        output = '\n'.join(lines)
+        if grep:
+            output = HostProcess.grep_filter(output, grep)
+        self._print(output)
+        return output
+
+    def shell_many(self, cmds, target_device=None):
+        ''' Runs several commands in a single shell invocation and returns a list of outputs '''
+        sep = f'__SEP_{uuid.uuid4().hex}__'
+        cmd = f'; echo {sep}; '.join(
+            [' '.join(HostProcess.type_check_cmd(cmd)) for cmd in cmds])
+        output = self.shell(cmd, target_device=target_device)
+        return [part.strip('\n') for part in output.split(sep)]
+
+    def exec_out(self, cmd, grep=None, target_device=None, binary=False):
         cmd = ['exec-out'] + HostProcess.type_check_cmd(cmd)
-        return self.run(cmd, grep=grep, target_device=target_device)
+        return self.run(cmd, grep=grep, target_device=target_device, binary=binary)
 
     def connect(self, target_device=None):
         cmd = [] if target_device is None else [target_device]
@@ -211,10 +451,15 @@ class ADB(HostProcess):
         # If this is the first connection, make it the default_target_device
         if self.default_target_device is None:
             self.default_target_device = device_id
-            
-        # Wait a few seconds for the connection to become active
-        time.sleep(3)
-        
+
+        # Poll until the connection becomes active instead of sleeping a flat 3 seconds
+        self.run('wait-for-device', target_device=device_id, timeout=3)
+        deadline = time.time() + 3
+        while time.time() < deadline:
+            if self.run('get-state', target_device=device_id).strip() == 'device':
+                break
+            time.sleep(0.05)
+
         return device_id
 
     def version(self):
@@ -228,7 +473,7 @@ class ADB(HostProcess):
         output = self.run('kill-server')
         self._print(output)
 
-    def await(self, target_device=None):
+    def wait_for_device(self, target_device=None):
         output = self.run('wait-for-device', target_device=target_device)
         self._print(output)
 
@@ -237,17 +482,28 @@ class ADB(HostProcess):
         self._print(output)
 
     def get_installed_packages(self, target_device=None):
-        packages = []
-        output = self.shell('pm list packages -f', target_device=target_device)
-        for package in output.splitlines():
-            parts = package.split('=')
-            if len(parts) == 2:
-                packages.append(parts[1].strip())
-        return packages
+        # One C-level regex pass over the undecoded output instead of splitting every line
+        output = self.exec_out('pm list packages -f', binary=True, target_device=target_device)
+        return [match.decode('utf-8') for match in _PKG_RE.findall(output)]
+
+    def iter_installed_packages(self, target_device=None):
+        ''' Yields installed package names one at a time as the device reports them,
+            without buffering the full listing in memory '''
+        if target_device is None and self.default_target_device:
+            target_device = self.default_target_device
+        opt = [] if target_device is None else ['-s', target_device]
+        cmd = opt + ['shell', 'pm', 'list', 'packages', '-f']
+        for line in HostProcess.exec_cmd_stream(self, cmd):
+            match = _PKG_LINE_RE.match(line)
+            if match:
+                yield match.group(1)
 
     def get_package_activities(self, package_name, target_device=None):
-        output = self.shell('dumpsys package ' + package_name)
-        matches = re.finditer(r'\w{8} %s/([\.\w]+) filter \w{8}' % package_name, output)
+        # Filter device-side so only candidate lines cross the USB wire; the precompiled
+        # host-side regex then extracts the activity names from the matching lines
+        output = self.shell(f'dumpsys package {package_name} | grep {package_name}/',
+                            target_device=target_device)
+        matches = _pkg_activities_re(package_name).finditer(output)
         seen_activities = set()
         for mat in matches:
             activity = mat.group(1)
@@ -257,21 +513,26 @@ class ADB(HostProcess):
 
     def get_window(self, target_device=None):
         ''' Returns the window that currently has focus '''
-        curr_focus = self.shell('dumpsys window windows', grep='mCurrentFocus',
-                                target_device=target_device)
-        curr_app = self.shell('dumpsys window windows', grep='mFocusedApp',
-                              target_device=target_device)
+        # A single dumpsys invocation, filtered device-side, provides both focus fields
+        output = self.shell('dumpsys window windows | grep -e mCurrentFocus -e mFocusedApp',
+                            target_device=target_device)
+        lines = output.splitlines()
+        curr_focus = '\n'.join([line for line in lines if _CURR_FOCUS_RE.search(line)])
+        curr_app = '\n'.join([line for line in lines if _FOCUSED_APP_RE.search(line)])
                               
-        output = re.findall(r'[\w\.]+/[\w\.]+', curr_app)
+        output = _FOCUS_RE.findall(curr_app)
         if len(output) == 0:
             raise RuntimeError('Current window focus could not be found in dumpsys')
 
         package_name, activity = output[0].split('/', 2)
 
-        if 'Application Error' in curr_focus:
-            raise SystemError('Application error')
-        elif 'Application Not Responding' in curr_focus:
-            raise TimeoutError('Application not responding')
+        # Single pass over the focus line catches all known error keywords
+        app_error = _APP_ERR_RE.search(curr_focus)
+        if app_error is not None:
+            if app_error.group(1) == 'Error':
+                raise SystemError('Application error')
+            else:
+                raise TimeoutError('Application not responding')
 
         return package_name, activity
         
@@ -293,24 +554,32 @@ class ADB(HostProcess):
                             target_device=target_device)
                             
     def url(self, url, target_device=None):
-        self.shell('am start -a android.intent.action.VIEW -d "%s"' % url,
+        self.shell(f'am start -a android.intent.action.VIEW -d "{url}"',
                    target_device=target_device)
 
     def wakeup(self, target_device=None):
+        if target_device is None and self.default_target_device:
+            target_device = self.default_target_device
+
+        # Skip the dumpsys probe entirely when this device's screen was confirmed on
+        # recently, so back-to-back key presses and taps do not pay a round-trip each time
+        if time.monotonic() - self._last_screen_on[target_device] < 10:
+            return
+
         if not self.pending_wakeup:
             self.pending_wakeup = True
-            isawake = lambda: self.shell('dumpsys power', grep='mScreenOn=|Display Power: state=')
-            
-            output = isawake()
-            if 'mScreenOn=false' in output or 'state=OFF' in output:
-                self._print('Waking up screen by pressing power button...')
-                self.press_key('power', target_device=target_device, wait=3)
-                self._print('Unlocking screen by pressing menu button...')
-                self.press_key('menu', target_device=target_device, wait=3)
-                output = isawake()
-            
+
+            # Check the screen state, press power + menu only if needed and report the final
+            # state, all within a single device-side shell invocation
+            script = ('if dumpsys power | grep -q -e mScreenOn=false -e state=OFF; then '
+                      f'input keyevent {__KEY_CODES__["POWER"]}; sleep 3; '
+                      f'input keyevent {__KEY_CODES__["MENU"]}; sleep 3; fi; '
+                      'dumpsys power | grep -e mScreenOn= -e "Display Power: state="')
+            output = self.shell(['sh', '-c', f"'{script}'"], target_device=target_device)
+
             if 'mScreenOn=true' not in output and 'state=ON' not in output:
                 raise RuntimeError('Wakeup failed or current screen state unknown')
+            self._last_screen_on[target_device] = time.monotonic()
             self.pending_wakeup = False
 
     def screenshot(self, target_device=None):
@@ -323,35 +592,37 @@ class ADB(HostProcess):
                               ' http://pypi.python.org/pypi/PIL/ for installation'
                               ' instructions.')
 
-        tmp = str(uuid.uuid4())
         self.wakeup(target_device=target_device)
-        # adb exec-out screencap -p > test.png
-        self.shell(['screencap', '/sdcard/%s.png' % tmp], target_device=target_device)
-        self.run(['pull', '/sdcard/%s.png' % tmp, '%s.png' % tmp], target_device=target_device)
-        self.shell(['rm', '/sdcard/%s.png' % tmp], target_device=target_device)
-        img = Image.open('%s.png' % tmp)
-        os.remove('%s.png' % tmp)
-        return img
-
-    def press_key(self, keynames, target_device=None, wait=0.5):
+        img_raw = self.exec_out(['screencap', '-p'], binary=True, target_device=target_device)
+        return Image.open(io.BytesIO(img_raw))
+
+    def press_key(self, keynames, target_device=None, wait=0):
+        ''' Sends all given keys as a single batched `input keyevent`; the device paces
+            delivery of the sequence, so `wait` is only needed when the next operation
+            depends on the UI settling after the last key press '''
         keynames = [k.upper() for k in HostProcess.type_check_cmd(keynames)]
         if not all(k in __KEY_CODES__ for k in keynames):
             raise ValueError('Provided key %r does not have a mapping' % keynames)
-        keycodes = ' '.join(['%d' % __KEY_CODES__[k] for k in keynames])
+        keycodes = ' '.join([str(__KEY_CODES__[k]) for k in keynames])
         self.wakeup(target_device=target_device)
-        self.shell('input keyevent %s' % keycodes, target_device=target_device)
-        time.sleep(wait)
+        self.shell(f'input keyevent {keycodes}', target_device=target_device)
+        if 'POWER' in keynames:
+            # Pressing power may have toggled the screen off, force this device's next probe
+            device = target_device if target_device is not None else self.default_target_device
+            self._last_screen_on[device] = 0.0
+        if wait > 0:
+            time.sleep(wait)
 
     def input_text(self, text, target_device=None, wait=0.5):
         self.wakeup(target_device=target_device)
-        self.shell('input text \'%s\'' % text.replace(' ', '%s'), target_device=target_device)
+        self.shell(f"input text '{text.replace(' ', '%s')}'", target_device=target_device)
         time.sleep(wait)
         
     def install(self, apk_file, target_device=None, opts='r'):
-        self.run('install %s %s' % (('-' + opts) if opts else '', apk_file),
+        self.run(f"install {'-' + opts if opts else ''} {apk_file}",
                  target_device=target_device)
 
     def uninstall(self, package_name, target_device=None, opts=None):
-        self.run('uninstall %s %s' % (('-' + opts) if opts else '', package_name),
+        self.run(f"uninstall {'-' + opts if opts else ''} {package_name}",
                  target_device=target_device)
                  
\ No newline at end of file